@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Chart Data Layer for WIP Analysis
+Aggregates inside DuckDB so charts only fetch a few hundred binned points,
+whatever the size of the table.
+
+    import chart_data
+    bins = chart_data.histogram(conn, '"Gross Profit %" * 100', -50, 150, bins=50)
+    median, = chart_data.quantiles(conn, '"Gross Profit %" * 100', [0.5])
+"""
+import numpy as np
+import pandas as pd
+
+
+def value_range(conn, expr, table='wip', where='TRUE'):
+    """(min, max) of an expression, computed in the database"""
+    return conn.execute(f"""
+        SELECT MIN({expr}), MAX({expr}) FROM {table} WHERE {where}
+    """).fetchone()
+
+
+def histogram(conn, expr, lo, hi, bins=50, table='wip', where='TRUE'):
+    """
+    Equal-width histogram of expr over [lo, hi].
+    Returns one row per bin (left, right, count), empty bins included.
+    """
+    width = (hi - lo) / bins
+    counts = conn.execute(f"""
+        SELECT LEAST(FLOOR((x - $lo) / $width), $bins - 1)::INTEGER AS bin,
+               COUNT(*) AS count
+        FROM (SELECT {expr} AS x FROM {table} WHERE {where})
+        WHERE x BETWEEN $lo AND $hi
+        GROUP BY bin
+    """, {'lo': lo, 'hi': hi, 'width': width, 'bins': bins}).df()
+
+    edges = lo + width * np.arange(bins + 1)
+    df = pd.DataFrame({'left': edges[:-1], 'right': edges[1:]})
+    df['count'] = (counts.set_index('bin')['count']
+                   .reindex(range(bins), fill_value=0).to_numpy())
+    return df
+
+
+def quantiles(conn, expr, qs, table='wip', where='TRUE'):
+    """
+    Continuous quantiles of expr, e.g. quantiles(conn, x, [0.5]) for the median.
+    NaN when no rows match, like pandas' quantile on an empty Series.
+    """
+    result = conn.execute(f"""
+        SELECT quantile_cont({expr}, $qs) FROM {table} WHERE {where}
+    """, {'qs': list(qs)}).fetchone()[0]
+    return [np.nan if v is None else v for v in result or [None] * len(qs)]
+
+
+def grid_density(conn, x_expr, y_expr, x_bins=40, y_bins=40, table='wip',
+                 where='TRUE', group=None, x_range=None, y_range=None, log_x=False):
+    """
+    2D grid counts for scatter-style charts.
+    Returns the occupied cells only: x, y (cell centres), count and, if a
+    group expression is given, its value as column grp. Ranges default to the
+    data's min/max.
+    log_x bins x on a log10 scale (for skewed values such as revenue); rows
+    with x <= 0 are left out and x is returned in the original units.
+    """
+    if log_x:
+        where = f"({where}) AND ({x_expr}) > 0"
+        x_expr = f"log10({x_expr})"
+        x_range = x_range and tuple(np.log10(x_range))
+    x_lo, x_hi = x_range or value_range(conn, x_expr, table, where)
+    y_lo, y_hi = y_range or value_range(conn, y_expr, table, where)
+    if x_lo is None or y_lo is None:
+        return pd.DataFrame(columns=['x', 'y', 'count'] + (['grp'] if group else []))
+    x_w = ((x_hi - x_lo) / x_bins) or 1
+    y_w = ((y_hi - y_lo) / y_bins) or 1
+    group_sel = ", grp" if group else ""
+    group_col = f", {group} AS grp" if group else ""
+
+    df = conn.execute(f"""
+        SELECT LEAST(FLOOR((x - $x_lo) / $x_w), $x_bins - 1)::INTEGER AS gx,
+               LEAST(FLOOR((y - $y_lo) / $y_w), $y_bins - 1)::INTEGER AS gy,
+               COUNT(*) AS count{group_sel}
+        FROM (SELECT {x_expr} AS x, {y_expr} AS y{group_col}
+              FROM {table} WHERE {where})
+        WHERE x BETWEEN $x_lo AND $x_hi AND y BETWEEN $y_lo AND $y_hi
+        GROUP BY ALL
+        ORDER BY ALL
+    """, {'x_lo': x_lo, 'x_hi': x_hi, 'x_w': x_w, 'x_bins': x_bins,
+          'y_lo': y_lo, 'y_hi': y_hi, 'y_w': y_w, 'y_bins': y_bins}).df()
+
+    df['x'] = x_lo + (df.pop('gx') + 0.5) * x_w
+    df['y'] = y_lo + (df.pop('gy') + 0.5) * y_w
+    if log_x:
+        df['x'] = 10 ** df['x']
+    return df[['x', 'y', 'count'] + [c for c in df.columns if c not in ('x', 'y', 'count')]]
@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
 """
 Custom Query Runner for WIP Analysis
-Interactive SQL query execution with save-to-CSV option
+Interactive SQL query execution with save-to-CSV/Excel option
+
+Every registered dataset (datasets.py) is attached to the session, so
+queries can join wip with casing_wip or address wip_analysis.wip directly.
 """
-import duckdb
 import sys
 
-conn = duckdb.connect('../wip_analysis.duckdb', read_only=True)
+import pandas as pd
+
+import datasets
+import export_excel
+
+PREVIEW_ROWS = 50
+
+conn = datasets.connect_session()
 
 
 def show_schema():
@@ -17,6 +26,11 @@ def show_schema():
     schema = conn.execute("DESCRIBE wip").df()
     print(schema.to_string(index=False))
     print(f"\n✓ {len(schema)} columns total")
+    tables = conn.execute("""
+        SELECT database_name || '.' || table_name FROM duckdb_tables()
+        WHERE table_name != '_generation' ORDER BY 1
+    """).fetchall()
+    print(f"✓ Attached tables: {', '.join(t for (t,) in tables)}")
 
 
 def show_sample_queries():
@@ -32,7 +46,9 @@ def show_sample_queries():
         ("Average margin by service type",
          'SELECT ServiceType, AVG("Gross Profit %") * 100 as avg_margin FROM wip GROUP BY ServiceType'),
         ("Open contracts with completion >90%",
-         'SELECT Contract, "% Complete" FROM wip WHERE "Contract Status" = \'Open\' AND "% Complete" > 0.9')
+         'SELECT Contract, "% Complete" FROM wip WHERE "Contract Status" = \'Open\' AND "% Complete" > 0.9'),
+        ("Contracts in wip but not in casing_wip",
+         'SELECT Contract FROM wip EXCEPT SELECT Contract FROM casing_wip')
     ]
     for i, (desc, query) in enumerate(examples, 1):
         print(f"\n{i}. {desc}:")
@@ -40,24 +56,40 @@ def show_sample_queries():
 
 
 def run_custom_query(query):
-    """Execute custom SQL query"""
+    """Execute custom SQL query, showing the first PREVIEW_ROWS rows"""
     try:
-        result = conn.execute(query).df()
+        conn.execute(query)
+        if conn.description is None:
+            print("\n✓ Statement executed")
+            return
+        columns = [d[0] for d in conn.description]
+        rows = conn.fetchmany(PREVIEW_ROWS + 1)
+        preview = pd.DataFrame(rows[:PREVIEW_ROWS], columns=columns)
         print("\n" + "="*80)
         print("📊 Query Results")
         print("="*80)
-        print(result.to_string(index=False))
-        print(f"\n✓ {len(result)} rows returned")
+        print(preview.to_string(index=False))
+        if len(rows) > PREVIEW_ROWS:
+            print(f"\n✓ First {PREVIEW_ROWS} rows shown (save to get them all)")
+        else:
+            print(f"\n✓ {len(rows)} rows returned")
 
-        # Offer to save
-        if len(result) > 0:
-            save = input("\n💾 Save to CSV? (y/n): ").strip().lower()
-            if save == 'y':
+        # Offer to save. Both formats re-run the query and stream the full
+        # result to disk, so large extracts are never held in memory
+        if rows:
+            save = input("\n💾 Save results? (c)sv / (x)lsx / (n)o: ").strip().lower()
+            if save in ('c', 'y'):
                 filename = input("Filename (without .csv): ").strip()
                 if filename:
                     csv_path = f"{filename}.csv"
-                    result.to_csv(csv_path, index=False)
+                    conn.sql(query).write_csv(csv_path)
                     print(f"✓ Saved to {csv_path}")
+            elif save == 'x':
+                filename = input("Filename (without .xlsx): ").strip()
+                if filename:
+                    xlsx_path = f"{filename}.xlsx"
+                    export_excel.export_queries([('Query', query)], xlsx_path, conn=conn)
+                    print(f"✓ Saved to {xlsx_path}")
     except Exception as e:
         print(f"❌ Error: {e}")
         print("\nTip: Use double quotes for column names with spaces")
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Dataset Registry for WIP Analysis
+One declarative list of every workbook-backed table, one loader for all of
+them, and one query session that sees all of them.
+
+A dataset is either stored (loaded into its own table) or a view over
+another dataset's table, so the same rows are never stored twice:
+casing_wip is wip's casing.xlsx rows. A view's date columns are converted
+along with its base dataset's when that is loaded.
+
+Loading: a dataset's source is one workbook or a folder of them (every
+workbook in FilesIn/ for wip). Each (workbook, sheet, header row) is parsed
+once per run, even when several datasets come from it; a workbook missing
+the dataset's required columns is skipped. Each target database is rebuilt
+through db_swap (copy → load → validate → atomic swap), and table _ingested
+records which workbook versions it holds, so watch_filesin.py can pick up
+from any load.
+
+Querying: connect_session() ATTACHes every registered database read-only into
+one in-memory DuckDB session and exposes their tables, and the view
+datasets, as views, so existing queries (FROM wip, FROM casing_wip) keep
+working and cross-database joins need no copies:
+
+    conn = datasets.connect_session()
+    conn.execute("SELECT COUNT(*) FROM wip JOIN casing_wip USING (Contract)")
+
+Tables can also be addressed by database: wip_analysis.wip.
+
+Usage:
+    python3 datasets.py                 # full reload of every stored dataset
+    python3 datasets.py wip             # load only these (a view loads its base)
+    python3 datasets.py --list          # show the registry
+    python3 datasets.py --allow-shrink  # accept far fewer rows than the live load
+"""
+import hashlib
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+import db_swap
+import dedup_customers
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Columns the reports, charts and customer mapping depend on
+WIP_REQUIRED_COLUMNS = [
+    'Contract', 'Description', 'Customer Name', 'Contract Status', 'Region',
+    'PM Name', 'ServiceType', 'Revenue To Date', 'Gross Profit',
+    'Gross Profit %', '% Complete', 'Backlog Revenue',
+]
+
+WORKBOOK_PATTERNS = ['*.xlsx', '*.xlsm']
+
+# name -> spec
+#   source                  a workbook, or a folder whose workbooks are all loaded
+#   sheet, header           sheet (falls back to the first 'WIP...' sheet), header row
+#   date_cols               columns converted to timestamps
+#   db, table               target database file and table
+#   required_columns        checked before a new generation is swapped in
+#   resolve_customers       optional: maintain customer_canonical in the same database
+# View datasets instead name the dataset they read (view_of), the workbook
+# whose rows they show (source), their date_cols and their view name. Their
+# date_cols are converted like the base dataset's, when the base is loaded.
+DATASETS = {
+    'wip': {
+        'source': ROOT / 'FilesIn',
+        'sheet': 'WIP - P10',
+        'header': 1,
+        'date_cols': ['WIPMth', 'Start Month', 'MonthClosed', 'Start Date'],
+        'db': ROOT / 'wip_analysis.duckdb',
+        'table': 'wip',
+        'required_columns': WIP_REQUIRED_COLUMNS,
+        'resolve_customers': True,
+    },
+    'casing': {
+        'view_of': 'wip',
+        'source': ROOT / 'FilesIn' / 'casing.xlsx',
+        'date_cols': ['WIPMth', 'Start Month', 'MonthClosed',
+                      'Dispatcher Start Date', 'Dispatcher End Date'],
+        'table': 'casing_wip',
+    },
+}
+
+
+def is_workbook(path):
+    path = Path(path)
+    # Skip Excel lock files (~$name.xlsx) and hidden/temporary copies
+    return (not path.name.startswith(('~$', '.'))
+            and any(path.match(p) for p in WORKBOOK_PATTERNS))
+
+
+def is_view(name):
+    return 'view_of' in DATASETS[name]
+
+
+def stored_datasets():
+    return [name for name in DATASETS if not is_view(name)]
+
+
+def source_files(spec):
+    """Workbooks a dataset is loaded from"""
+    source = spec['source']
+    if source.is_dir():
+        return sorted(p for pattern in WORKBOOK_PATTERNS
+                      for p in source.glob(pattern) if is_workbook(p))
+    return [source]
+
+
+def targets(path):
+    """Stored datasets loaded from workbook `path`"""
+    path = Path(path).resolve()
+    found = []
+    for name in stored_datasets():
+        source = DATASETS[name]['source'].resolve()
+        if path == source or (path.parent == source and is_workbook(path)):
+            found.append(name)
+    return found
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_wip_sheet(file_path, preferred=None):
+    """preferred if the workbook has it, else the first sheet whose name
+    starts with 'WIP', else the first sheet"""
+    sheets = pd.ExcelFile(file_path).sheet_names
+    if preferred in sheets:
+        return preferred
+    return next((s for s in sheets if s.upper().startswith('WIP')), sheets[0])
+
+
+def read_sheet(file_path, sheet_name=None, header=1):
+    """Parse one sheet as-is, tagging rows with their workbook"""
+    sheet_name = find_wip_sheet(file_path, sheet_name)
+    df = pd.read_excel(file_path, sheet_name=sheet_name, header=header)
+    df['source_file'] = Path(file_path).name
+    return df
+
+
+def check_columns(df, spec, source_file):
+    """Reject a workbook that lacks the dataset's required columns"""
+    missing = [c for c in spec['required_columns'] if c not in df.columns]
+    if missing:
+        raise db_swap.ValidationError(
+            f"{source_file} is missing columns: {', '.join(missing)}")
+
+
+def date_columns(spec):
+    """Columns converted to timestamps for a stored dataset and its views"""
+    cols = list(spec['date_cols'])
+    for view in DATASETS.values():
+        if 'view_of' in view and DATASETS[view['view_of']] is spec:
+            cols += [c for c in view['date_cols'] if c not in cols]
+    return cols
+
+
+def prepare(df, spec):
+    """Apply a dataset's type conversions to a (shared) parsed sheet"""
+    df = df.copy()
+    for col in date_columns(spec):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def read_workbook(file_path, name='wip'):
+    """Read one workbook for dataset `name` (used by the watcher)"""
+    spec = DATASETS[name]
+    return prepare(read_sheet(file_path, spec['sheet'], spec['header']), spec)
+
+
+def load_table(conn, df, table):
+    """Replace the whole table with df"""
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.register('df_view', df)
+    conn.execute(f"CREATE TABLE {table} AS SELECT * FROM df_view")
+    conn.unregister('df_view')
+
+
+def ingest_workbook(conn, df, table, source_file):
+    """
+    Replace only the rows from source_file with df (an empty df just deletes
+    them). Columns the table does not have are left out - run a full load to
+    add them. Returns (rows loaded, ignored columns).
+    """
+    conn.register('df_view', df)
+    try:
+        exists = conn.execute("""
+            SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?
+        """, [table]).fetchone()[0]
+        if not exists:
+            conn.execute(f"CREATE TABLE {table} AS SELECT * FROM df_view")
+            return len(df), []
+
+        current = {r[0] for r in conn.execute(f"DESCRIBE {table}").fetchall()}
+        columns = [c for c in df.columns if c in current]
+        ignored = [c for c in df.columns if c not in current]
+        select = ', '.join(f'"{c}"' for c in columns)
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            conn.execute(f"DELETE FROM {table} WHERE source_file = ?", [source_file])
+            conn.execute(f"INSERT INTO {table} BY NAME SELECT {select} FROM df_view")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(df), ignored
+    finally:
+        conn.unregister('df_view')
+
+
+def delete_workbook(conn, table, source_file):
+    """Remove a workbook's rows (it was deleted from its folder)"""
+    conn.execute(f"DELETE FROM {table} WHERE source_file = ?", [source_file])
+
+
+def create_ingest_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _ingested (
+            dataset VARCHAR, source_file VARCHAR, digest VARCHAR,
+            rows BIGINT, ingested_at TIMESTAMP)
+    """)
+
+
+def record_ingest(conn, name, source_file, digest=None, rows=None):
+    """Note which version of a workbook a dataset holds (digest None: removed)"""
+    create_ingest_table(conn)
+    conn.execute("DELETE FROM _ingested WHERE dataset = ? AND source_file = ?",
+                 [name, source_file])
+    if digest is not None:
+        conn.execute("INSERT INTO _ingested VALUES (?, ?, ?, ?, ?)",
+                     [name, source_file, digest, rows, datetime.now()])
+
+
+def ingested(name):
+    """{source_file: (digest, rows)} held by the live database of dataset `name`"""
+    db_path = DATASETS[name]['db']
+    if not db_path.exists():
+        return {}
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        if not conn.execute("""
+            SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '_ingested'
+        """).fetchone()[0]:
+            return {}
+        return {f: (d, r) for f, d, r in conn.execute("""
+            SELECT source_file, digest, rows FROM _ingested WHERE dataset = ?
+        """, [name]).fetchall()}
+    finally:
+        conn.close()
+
+
+def previous_rows(conn, name, removed=()):
+    """
+    Rows of dataset `name` in the generation being built from, less the rows
+    of the workbooks in `removed`: deleting a workbook is an explicit removal,
+    not a shrink
+    """
+    rows = db_swap.row_count(conn, DATASETS[name]['table'])
+    if rows and removed:
+        create_ingest_table(conn)
+        rows -= conn.execute("""
+            SELECT COALESCE(SUM(rows), 0) FROM _ingested
+            WHERE dataset = ? AND list_contains(?, source_file)
+        """, [name, list(removed)]).fetchone()[0]
+    return rows
+
+
+def validate(conn, names, previous_rows=None, max_shrink=db_swap.MAX_SHRINK):
+    """
+    Raise db_swap.ValidationError unless every dataset's table looks complete.
+    previous_rows ({name: rows} in the live generation) enables the shrink check.
+    """
+    previous_rows = previous_rows or {}
+    for name in names:
+        spec = DATASETS[name]
+        db_swap.validate_table(conn, spec['table'], spec['required_columns'],
+                               previous_rows=previous_rows.get(name),
+                               max_shrink=max_shrink)
+
+
+def refresh_derived(conn, names):
+    """Rebuild tables derived from the given datasets (customer_canonical)"""
+    for name in names:
+        spec = DATASETS[name]
+        if spec.get('resolve_customers'):
+            stats = dedup_customers.resolve_customers(conn, spec['table'])
+            print(f"   ✓ {name}: customer names {stats['new_names']:,} new, "
+                  f"{stats['names']:,} names → {stats['clusters']:,} customers")
+
+
+def load(names=None, allow_shrink=False):
+    """
+    Full reload of the given stored datasets (default: all; a view dataset
+    stands for the dataset it reads). Returns {name: rows}.
+    Each workbook sheet is parsed once; each database gets one new generation.
+    A load where a table or a workbook would lose more than db_swap.MAX_SHRINK
+    of its rows (a header-only workbook included) is rejected unless
+    allow_shrink; workbooks no longer in the folder are removed as intended.
+    """
+    names = list(names or stored_datasets())
+    unknown = [n for n in names if n not in DATASETS]
+    if unknown:
+        raise KeyError(f"unknown dataset(s): {', '.join(unknown)} "
+                       f"(registered: {', '.join(DATASETS)})")
+    names = list(dict.fromkeys(DATASETS[n].get('view_of', n) for n in names))
+
+    parsed = {}
+    frames = {}
+    loaded = {}   # name -> [(source_file, digest, rows)]
+    removed = {}  # name -> workbooks it holds that are no longer present
+    max_shrink = None if allow_shrink else db_swap.MAX_SHRINK
+    for name in names:
+        spec = DATASETS[name]
+        parts = []
+        loaded[name] = []
+        previous = ingested(name)
+        removed[name] = set(previous) - {p.name for p in source_files(spec)}
+        for path in source_files(spec):
+            key = (path, spec['sheet'], spec['header'])
+            if key not in parsed:
+                t0 = time.perf_counter()
+                parsed[key] = read_sheet(*key)
+                print(f"   ✓ Parsed {path.name}: "
+                      f"{len(parsed[key]):,} rows in {time.perf_counter() - t0:.2f}s")
+            try:
+                check_columns(parsed[key], spec, path.name)
+            except db_swap.ValidationError as e:
+                print(f"   ⚠️  {name}: skipped {e}")
+                continue
+            db_swap.check_shrink(path.name, previous.get(path.name, (None, 0))[1],
+                                 len(parsed[key]), max_shrink)
+            parts.append(prepare(parsed[key], spec))
+            loaded[name].append((path.name, file_digest(path), len(parsed[key])))
+        if not parts:
+            raise db_swap.ValidationError(f"{name}: no workbook has the required columns")
+        frames[name] = pd.concat(parts, ignore_index=True)
+
+    by_db = {}
+    for name in names:
+        by_db.setdefault(DATASETS[name]['db'], []).append(name)
+
+    for db_path, db_names in by_db.items():
+        def build(conn):
+            # The build starts from a copy of the live generation
+            previous = {name: previous_rows(conn, name, removed[name])
+                        for name in db_names}
+            for name in db_names:
+                load_table(conn, frames[name], DATASETS[name]['table'])
+                print(f"   ✓ {name}: table '{DATASETS[name]['table']}' "
+                      f"({len(frames[name]):,} rows)")
+                create_ingest_table(conn)
+                conn.execute("DELETE FROM _ingested WHERE dataset = ?", [name])
+                for source_file, digest, rows in loaded[name]:
+                    record_ingest(conn, name, source_file, digest, rows)
+            # Validate before deriving anything from the new rows
+            validate(conn, db_names, previous, max_shrink)
+            refresh_derived(conn, db_names)
+
+        generation = db_swap.build_generation(db_path, build)
+        print(f"   ✓ {db_path.name}: generation {generation} swapped in")
+
+    return {name: len(frames[name]) for name in names}
+
+
+def view_sql(conn, name):
+    """SELECT for a view dataset, or None if its base table is not loaded"""
+    spec = DATASETS[name]
+    base = DATASETS[spec['view_of']]['table']
+    try:
+        conn.execute(f'DESCRIBE "{base}"')
+    except duckdb.CatalogException:
+        return None
+    # Its date_cols were already converted when the base dataset was loaded
+    source_file = spec['source'].name.replace("'", "''")
+    return f"""SELECT * FROM "{base}" WHERE source_file = '{source_file}'"""
+
+
+def connect_session(names=None):
+    """
+    In-memory DuckDB session with every registered database that exists
+    ATTACHed read-only, a view per table so unqualified names work, and the
+    view datasets on top. If two databases have a table of the same name, the
+    first registered wins for the unqualified view; both stay reachable as
+    <db>.<table>.
+    """
+    names = list(names or DATASETS)
+    stored = list(dict.fromkeys(DATASETS[n].get('view_of', n) for n in names))
+    conn = duckdb.connect()
+    attached = {}
+    for name in stored:
+        db_path = DATASETS[name]['db']
+        if db_path in attached.values() or not db_path.exists():
+            continue
+        alias = db_path.stem
+        conn.execute(f"ATTACH '{db_path}' AS {alias} (READ_ONLY)")
+        attached[alias] = db_path
+
+    seen = set()
+    for alias in attached:
+        tables = conn.execute("""
+            SELECT table_name FROM duckdb_tables()
+            WHERE database_name = ? AND NOT starts_with(table_name, '_')
+        """, [alias]).fetchall()
+        for (table,) in tables:
+            if table not in seen:
+                conn.execute(f'CREATE TEMP VIEW "{table}" AS SELECT * FROM {alias}."{table}"')
+                seen.add(table)
+
+    for name in names:
+        if is_view(name):
+            sql = view_sql(conn, name)
+            if sql:
+                conn.execute(f'CREATE TEMP VIEW "{DATASETS[name]["table"]}" AS {sql}')
+    return conn
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '--list' in args:
+        print("📚 Registered datasets")
+        print("="*80)
+        for name, spec in DATASETS.items():
+            source = spec['source'].relative_to(ROOT)
+            if is_view(name):
+                print(f"   {name:8s} {source} rows of {spec['view_of']} "
+                      f"→ view {spec['table']}")
+            else:
+                print(f"   {name:8s} {source}{'/' if spec['source'].is_dir() else ''} "
+                      f"[{spec['sheet']}] → {spec['db'].name}:{spec['table']}")
+        sys.exit(0)
+
+    print("🦆 Loading registered datasets")
+    print("="*80)
+    start = time.perf_counter()
+    try:
+        load([a for a in args if not a.startswith('--')] or None,
+             allow_shrink='--allow-shrink' in args)
+    except db_swap.ValidationError as e:
+        print(f"\n❌ Rejected, live database unchanged: {e}")
+        sys.exit(1)
+    print(f"\n✅ Done in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Atomic Build-and-Swap for the DuckDB Files
+Writers never modify the live database in place. Instead they:
+
+1. copy the live file to a private temporary file,
+2. make their changes there and validate the result,
+3. atomically rename it over the live file.
+
+Readers with an open read-only connection keep reading the generation they
+opened (POSIX keeps the old file alive until they disconnect) and see the
+new one on reconnect. Each build gets a generation number, stored in table
+_generation. The previous KEEP_GENERATIONS files are kept next to the live
+one as <name>.gen<N>.duckdb.
+
+    import db_swap
+    generation = db_swap.build_generation(db_swap.DB_PATH, build_fn,
+                                          validate=validate_fn)
+
+datasets.py drives this for every registered database.
+
+Usage:
+    python3 db_swap.py [db_path]   # show the live generation and kept ones
+"""
+import fcntl
+import os
+import shutil
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+
+DB_PATH = Path(__file__).resolve().parent.parent / 'wip_analysis.duckdb'
+KEEP_GENERATIONS = 1
+# A build may not lose more than this share of a table's rows compared with
+# the live generation (a truncated workbook looks like a valid one otherwise)
+MAX_SHRINK = 0.5
+
+
+class ValidationError(Exception):
+    """A freshly built database failed validation and was not swapped in"""
+
+
+@contextmanager
+def writer_lock(db_path):
+    """Serialises builders of the same database (readers never take it)"""
+    lock_path = Path(f"{db_path}.lock")
+    with open(lock_path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def generation_path(db_path, generation):
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}.gen{generation}{db_path.suffix}")
+
+
+def current_generation(conn):
+    """Generation number of an open database (0 if it predates generations)"""
+    exists = conn.execute("""
+        SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '_generation'
+    """).fetchone()[0]
+    if not exists:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(generation), 0) FROM _generation").fetchone()[0]
+
+
+def table_counts(conn):
+    return dict(conn.execute("""
+        SELECT table_name, estimated_size FROM duckdb_tables()
+        WHERE NOT temporary AND table_name != '_generation'
+    """).fetchall())
+
+
+def check_shrink(what, previous_rows, rows, max_shrink=MAX_SHRINK):
+    """Raise ValidationError if rows dropped by more than max_shrink (None: no limit)"""
+    if previous_rows and max_shrink is not None and rows < previous_rows * (1 - max_shrink):
+        raise ValidationError(
+            f"{what} shrank from {previous_rows:,} to {rows:,} rows "
+            f"(limit {max_shrink:.0%}; use --allow-shrink if this is intended)")
+
+
+def row_count(conn, table):
+    """Rows in table, or None if it does not exist"""
+    if table not in table_counts(conn):
+        return None
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def validate_table(conn, table, required_columns=(), min_rows=1,
+                   previous_rows=None, max_shrink=MAX_SHRINK):
+    """
+    Raise ValidationError unless table exists with enough rows and columns.
+    previous_rows is the live generation's count, for the shrink check.
+    """
+    tables = table_counts(conn)
+    if table not in tables:
+        raise ValidationError(f"table '{table}' is missing")
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    if rows < min_rows:
+        raise ValidationError(f"table '{table}' has {rows} rows (expected ≥ {min_rows})")
+    columns = {r[0] for r in conn.execute(f"DESCRIBE {table}").fetchall()}
+    missing = [c for c in required_columns if c not in columns]
+    if missing:
+        raise ValidationError(f"table '{table}' is missing columns: {', '.join(missing)}")
+    check_shrink(f"table '{table}'", previous_rows, rows, max_shrink)
+
+
+def prune_generations(db_path, keep=KEEP_GENERATIONS):
+    db_path = Path(db_path)
+    pattern = f"{db_path.stem}.gen*{db_path.suffix}"
+    kept = sorted(db_path.parent.glob(pattern),
+                  key=lambda p: int(p.stem.rsplit('.gen', 1)[1]), reverse=True)
+    for old in kept[keep:]:
+        old.unlink()
+
+
+def build_generation(db_path, build, validate=None, keep=KEEP_GENERATIONS):
+    """
+    Run build(conn) against a copy of db_path (or a new, empty database if it
+    does not exist yet), validate it, then swap it in atomically.
+    Returns the new generation number. On any error the live file is left
+    untouched and the temporary copy is removed.
+    """
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(f".{db_path.name}.building-{os.getpid()}")
+
+    with writer_lock(db_path):
+        if db_path.exists():
+            shutil.copy2(db_path, tmp_path)
+            # A WAL left by an older in-place writer holds committed changes
+            if Path(f"{db_path}.wal").exists():
+                shutil.copy2(f"{db_path}.wal", f"{tmp_path}.wal")
+        try:
+            conn = duckdb.connect(str(tmp_path))
+            try:
+                generation = current_generation(conn) + 1
+                build(conn)
+                if validate:
+                    validate(conn)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS _generation (generation INTEGER, built_at TIMESTAMP)
+                """)
+                conn.execute("INSERT INTO _generation VALUES (?, ?)", [generation, datetime.now()])
+                conn.execute("CHECKPOINT")
+            finally:
+                conn.close()
+
+            # Keep the outgoing generation under its own name, then swap.
+            # os.replace is atomic: readers see either the old or new file.
+            if db_path.exists() and keep > 0:
+                previous = generation_path(db_path, generation - 1)
+                previous.unlink(missing_ok=True)
+                try:
+                    os.link(db_path, previous)
+                except OSError:
+                    shutil.copy2(db_path, previous)
+            os.replace(tmp_path, db_path)
+            # Already folded into the new file; must not be replayed onto it
+            Path(f"{db_path}.wal").unlink(missing_ok=True)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            Path(f"{tmp_path}.wal").unlink(missing_ok=True)
+        prune_generations(db_path, keep)
+    return generation
+
+
+if __name__ == "__main__":
+    db_path = Path(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
+    print(f"🗂️  Generations of {db_path}")
+    print("="*80)
+    for path in [db_path] + sorted(db_path.parent.glob(f"{db_path.stem}.gen*{db_path.suffix}")):
+        conn = duckdb.connect(str(path), read_only=True)
+        label = 'live' if path == db_path else 'kept'
+        print(f"   {label:5s} gen {current_generation(conn):>4}  {path.name}")
+        for table, rows in sorted(table_counts(conn).items()):
+            print(f"            {table:25s} ~{rows:,} rows")
+        conn.close()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Customer Name Entity Resolution for WIP Analysis
+Maps spelling variants of "Customer Name" to one canonical name.
+
+Names are normalised (case, punctuation, legal suffixes) and split into
+character trigrams. The trigrams form a blocking index: only names that share
+a rare trigram are compared, and scoring (trigram Jaccard +
+Jaro-Winkler) runs as a single DuckDB join rather than an all-pairs loop.
+
+Character scores alone are dominated by shared generic words ("EOG Resources"
+vs "EQT Resources"), so a pair must also pass a word-level check: each word
+must have a close spelling in the other name, weighted by IDF so that rare,
+distinctive words count most. Clusters use complete linkage - a name joins a
+cluster only if it matches every member - so a short name like "Elgsf Inc"
+cannot chain "Elgsf Kiwj" and "Elgsf Ttxb" together.
+
+Results go to table customer_canonical (raw_name, canonical_name, cluster_id).
+Runs are incremental: only names not yet in the mapping are compared, and
+existing clusters keep their canonical name. Table customer_overrides pins a
+raw name to a canonical name and is applied after every run; to split off a
+wrong merge, pin the name to a canonical name no other cluster uses.
+
+Usage:
+    python3 dedup_customers.py            # map new names
+    python3 dedup_customers.py --rebuild  # recompute the whole mapping
+    python3 dedup_customers.py --override "EQT Resources" "EQT Resources"
+    python3 dedup_customers.py --clear-override "EQT Resources"
+"""
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+import db_swap
+
+DB_PATH = Path(__file__).resolve().parent.parent / 'wip_analysis.duckdb'
+
+# Trigrams shared by more names than this are too common to block on,
+# except for each name's MIN_BLOCK_KEYS rarest trigrams
+MAX_BLOCK_SIZE = 100
+MIN_BLOCK_KEYS = 2
+# A candidate pair matches when both scores reach these thresholds
+MIN_JACCARD = 0.5
+MIN_JARO_WINKLER = 0.9
+# ... and when words with a close spelling (Jaro-Winkler >= MIN_WORD_JARO_WINKLER)
+# in the other name carry this share of both names' IDF word weight
+MIN_WORD_JARO_WINKLER = 0.9
+MIN_WORD_SCORE = 0.75
+
+LEGAL_SUFFIXES = ['inc', 'incorporated', 'llc', 'llp', 'lp', 'ltd', 'limited',
+                  'corp', 'corporation', 'co', 'company', 'the']
+
+NORMALIZE_SQL = rf"""
+    COALESCE(NULLIF(trim(regexp_replace(regexp_replace(
+        regexp_replace(lower(raw_name), '[^a-z0-9 ]', ' ', 'g'),
+        '\b({'|'.join(LEGAL_SUFFIXES)})\b', ' ', 'g'),
+        '\s+', ' ', 'g')), ''), lower(trim(raw_name)))
+"""
+
+
+def create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_names (
+            name_id INTEGER, raw_name VARCHAR, norm_name VARCHAR, n_grams INTEGER)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_name_grams (name_id INTEGER, gram VARCHAR)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_canonical (
+            raw_name VARCHAR, canonical_name VARCHAR, cluster_id INTEGER)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_overrides (
+            raw_name VARCHAR PRIMARY KEY, canonical_name VARCHAR, added_at TIMESTAMP)
+    """)
+
+
+def drop_tables(conn):
+    """Drop the computed mapping (manual overrides are kept)"""
+    for table in ['customer_canonical', 'customer_name_grams', 'customer_names']:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def add_new_names(conn, source_table):
+    """Index names not yet mapped; returns how many were added"""
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE new_names AS
+        SELECT (SELECT COALESCE(MAX(name_id), 0) FROM customer_names)
+                   + ROW_NUMBER() OVER (ORDER BY raw_name) AS name_id,
+               raw_name,
+               {NORMALIZE_SQL} AS norm_name
+        FROM (SELECT DISTINCT "Customer Name" AS raw_name FROM {source_table}
+              WHERE "Customer Name" IS NOT NULL AND trim("Customer Name") != '')
+        WHERE raw_name NOT IN (SELECT raw_name FROM customer_names)
+    """)
+    conn.execute("""
+        INSERT INTO customer_name_grams
+        SELECT DISTINCT name_id, unnest(list_transform(
+                   range(1, length(padded) - 1), i -> substr(padded, i, 3))) AS gram
+        FROM (SELECT name_id, '  ' || norm_name || ' ' AS padded FROM new_names)
+    """)
+    conn.execute("""
+        INSERT INTO customer_names
+        SELECT n.name_id, n.raw_name, n.norm_name, COUNT(g.gram)
+        FROM new_names n JOIN customer_name_grams g USING (name_id)
+        GROUP BY ALL
+    """)
+    return conn.execute("SELECT COUNT(*) FROM new_names").fetchone()[0]
+
+
+def candidate_matches(conn):
+    """
+    Scored pairs (new name, any other name) that share a block and match.
+
+    Block keys are a name's trigrams that occur in at most MAX_BLOCK_SIZE
+    names, plus its MIN_BLOCK_KEYS rarest trigrams so that no name is left
+    without a block.
+    """
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE name_blocks AS
+        SELECT name_id, gram FROM (
+            SELECT g.name_id, g.gram, f.freq,
+                   ROW_NUMBER() OVER (PARTITION BY g.name_id ORDER BY f.freq, g.gram) AS rnk
+            FROM customer_name_grams g
+            JOIN (SELECT gram, COUNT(*) AS freq FROM customer_name_grams GROUP BY gram) f
+            USING (gram))
+        WHERE freq <= {MAX_BLOCK_SIZE} OR rnk <= {MIN_BLOCK_KEYS}
+    """)
+
+    # Shared block grams plus the most the unblocked grams could add bound
+    # the Jaccard score, so pairs that cannot reach MIN_JACCARD are dropped
+    # before any exact scoring
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE candidate_pairs AS
+        WITH block_counts AS (
+            SELECT name_id, COUNT(*) AS n_blocks FROM name_blocks GROUP BY name_id
+        ),
+        -- New names get the highest ids, so b_id < a_id covers every
+        -- new-vs-existing pair and each new-vs-new pair exactly once
+        pairs AS (
+            SELECT a.name_id AS a_id, b.name_id AS b_id, COUNT(*) AS n_shared
+            FROM name_blocks a
+            JOIN new_names USING (name_id)
+            JOIN name_blocks b ON a.gram = b.gram AND b.name_id < a.name_id
+            GROUP BY ALL
+        )
+        SELECT p.a_id, p.b_id
+        FROM pairs p
+        JOIN customer_names a ON a.name_id = p.a_id
+        JOIN customer_names b ON b.name_id = p.b_id
+        JOIN block_counts ka ON ka.name_id = p.a_id
+        JOIN block_counts kb ON kb.name_id = p.b_id
+        WHERE p.n_shared + LEAST(a.n_grams - ka.n_blocks, b.n_grams - kb.n_blocks)
+              >= {MIN_JACCARD} / (1 + {MIN_JACCARD}) * (a.n_grams + b.n_grams)
+    """)
+
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE scored_pairs AS
+        WITH shared AS (
+            SELECT c.a_id, c.b_id, COUNT(*) AS n_shared
+            FROM candidate_pairs c
+            JOIN customer_name_grams ga ON ga.name_id = c.a_id
+            JOIN customer_name_grams gb ON gb.name_id = c.b_id AND gb.gram = ga.gram
+            GROUP BY ALL
+        ),
+        scored AS (
+            SELECT s.a_id, s.b_id, a.norm_name = b.norm_name AS same_norm,
+                   s.n_shared / (a.n_grams + b.n_grams - s.n_shared) AS jaccard,
+                   jaro_winkler_similarity(a.norm_name, b.norm_name) AS jaro_winkler
+            FROM shared s
+            JOIN customer_names a ON a.name_id = s.a_id
+            JOIN customer_names b ON b.name_id = s.b_id
+        )
+        SELECT a_id, b_id, same_norm, jaccard, jaro_winkler
+        FROM scored
+        WHERE same_norm
+           OR (jaccard >= {MIN_JACCARD} AND jaro_winkler >= {MIN_JARO_WINKLER})
+    """)
+
+    # Word-level check: the IDF-weighted share of words (from both names)
+    # that have a close spelling in the other name
+    return conn.execute(f"""
+        WITH words AS (
+            SELECT DISTINCT name_id, unnest(string_split(norm_name, ' ')) AS word
+            FROM customer_names
+        ),
+        idf AS (
+            SELECT word, ln(1 + (SELECT COUNT(*) FROM customer_names)
+                             / COUNT(*)) AS weight
+            FROM words GROUP BY word
+        ),
+        sides AS (
+            SELECT p.a_id AS self_id, p.b_id AS other_id, p.a_id, p.b_id FROM scored_pairs p
+            UNION ALL
+            SELECT p.b_id, p.a_id, p.a_id, p.b_id FROM scored_pairs p
+        ),
+        word_hits AS (
+            SELECT s.a_id, s.b_id, w.word, i.weight,
+                   MAX(jaro_winkler_similarity(w.word, o.word)) >= {MIN_WORD_JARO_WINKLER} AS hit
+            FROM sides s
+            JOIN words w ON w.name_id = s.self_id
+            JOIN idf i USING (word)
+            JOIN words o ON o.name_id = s.other_id
+            GROUP BY s.a_id, s.b_id, s.self_id, w.word, i.weight
+        ),
+        word_scores AS (
+            SELECT a_id, b_id, SUM(CASE WHEN hit THEN weight ELSE 0 END) / SUM(weight) AS word_score
+            FROM word_hits GROUP BY ALL
+        )
+        SELECT p.a_id, p.b_id, p.jaccard, p.jaro_winkler
+        FROM scored_pairs p JOIN word_scores w USING (a_id, b_id)
+        WHERE p.same_norm OR w.word_score >= {MIN_WORD_SCORE}
+    """).fetchall()
+
+
+def assign_clusters(conn, matches, source_table):
+    """
+    Attach each new name to a cluster by complete linkage: matches are taken
+    best score first, and two groups merge only if every name in one matched
+    every name in the other. A group can join one existing cluster; existing
+    clusters are never merged with each other.
+    """
+    new_ids = [r[0] for r in conn.execute("SELECT name_id FROM new_names").fetchall()]
+    existing = dict(conn.execute("""
+        SELECT n.name_id, c.cluster_id
+        FROM customer_names n JOIN customer_canonical c USING (raw_name)
+    """).fetchall())
+
+    matched = {frozenset((a, b)) for a, b, _, _ in matches}
+
+    # Groups are keyed by a new name's id, or ('cluster', id) for an existing cluster
+    group_of = {i: i for i in new_ids}
+    groups = {i: {i} for i in new_ids}
+    touched = {existing[b] for _, b, _, _ in matches if b in existing}
+    for i, cluster_id in existing.items():
+        if cluster_id in touched:
+            groups.setdefault(('cluster', cluster_id), set()).add(i)
+            group_of[i] = ('cluster', cluster_id)
+
+    for a, b, _, _ in sorted(matches, key=lambda m: m[2] + m[3], reverse=True):
+        ga, gb = group_of[a], group_of[b]
+        if ga == gb or (isinstance(ga, tuple) and isinstance(gb, tuple)):
+            continue
+        if all(frozenset((x, y)) in matched for x in groups[ga] for y in groups[gb]):
+            if isinstance(gb, tuple):
+                ga, gb = gb, ga
+            for i in groups[gb]:
+                group_of[i] = ga
+            groups[ga] |= groups.pop(gb)
+
+    next_id = conn.execute(
+        "SELECT COALESCE(MAX(cluster_id), 0) + 1 FROM customer_canonical").fetchone()[0]
+    rows = []
+    fresh = {}
+    for i in new_ids:
+        group = group_of[i]
+        if isinstance(group, tuple):
+            rows.append((i, group[1]))
+        else:
+            if group not in fresh:
+                fresh[group] = next_id
+                next_id += 1
+            rows.append((i, fresh[group]))
+
+    conn.register('cluster_rows', pd.DataFrame(rows, columns=['name_id', 'cluster_id']))
+    conn.execute("CREATE OR REPLACE TEMP TABLE new_clusters AS SELECT * FROM cluster_rows")
+    conn.unregister('cluster_rows')
+
+    # Canonical name for a new cluster: its most-used spelling
+    conn.execute(f"""
+        INSERT INTO customer_canonical
+        WITH usage AS (
+            SELECT "Customer Name" AS raw_name, COUNT(*) AS contracts
+            FROM {source_table} GROUP BY ALL
+        ),
+        existing_names AS (
+            SELECT DISTINCT cluster_id, canonical_name FROM customer_canonical
+        ),
+        fresh_names AS (
+            SELECT nc.cluster_id,
+                   arg_max(n.raw_name, (COALESCE(u.contracts, 0), n.raw_name)) AS canonical_name
+            FROM new_clusters nc
+            JOIN new_names n USING (name_id)
+            LEFT JOIN usage u USING (raw_name)
+            WHERE nc.cluster_id NOT IN (SELECT cluster_id FROM existing_names)
+            GROUP BY nc.cluster_id
+        )
+        SELECT n.raw_name,
+               COALESCE(e.canonical_name, f.canonical_name),
+               nc.cluster_id
+        FROM new_clusters nc
+        JOIN new_names n USING (name_id)
+        LEFT JOIN existing_names e USING (cluster_id)
+        LEFT JOIN fresh_names f USING (cluster_id)
+    """)
+
+
+def apply_overrides(conn):
+    """
+    Move overridden names to the cluster of their canonical name (a new
+    cluster if no mapped name has that canonical name yet)
+    """
+    conn.execute("""
+        CREATE OR REPLACE TEMP TABLE override_clusters AS
+        SELECT o.canonical_name,
+               COALESCE(
+                   (SELECT MIN(c.cluster_id) FROM customer_canonical c
+                    WHERE c.canonical_name = o.canonical_name),
+                   (SELECT COALESCE(MAX(cluster_id), 0) FROM customer_canonical)
+                       + DENSE_RANK() OVER (ORDER BY o.canonical_name)) AS cluster_id
+        FROM (SELECT DISTINCT canonical_name FROM customer_overrides) o
+    """)
+    conn.execute("""
+        UPDATE customer_canonical c
+        SET canonical_name = o.canonical_name, cluster_id = oc.cluster_id
+        FROM customer_overrides o JOIN override_clusters oc USING (canonical_name)
+        WHERE c.raw_name = o.raw_name
+    """)
+
+
+def set_override(conn, raw_name, canonical_name=None):
+    """Pin raw_name to canonical_name, or remove its override if None"""
+    create_tables(conn)
+    conn.execute("DELETE FROM customer_overrides WHERE raw_name = ?", [raw_name])
+    if canonical_name is not None:
+        conn.execute("INSERT INTO customer_overrides VALUES (?, ?, now())",
+                     [raw_name, canonical_name])
+
+
+def resolve_customers(conn, source_table='wip', rebuild=False):
+    """Update customer_canonical for names in source_table; returns summary counts"""
+    if rebuild:
+        drop_tables(conn)
+    create_tables(conn)
+    added = add_new_names(conn, source_table)
+    if added:
+        assign_clusters(conn, candidate_matches(conn), source_table)
+    apply_overrides(conn)
+    names, clusters = conn.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT cluster_id) FROM customer_canonical
+    """).fetchone()
+    return {'new_names': added, 'names': names, 'clusters': clusters}
+
+
+if __name__ == "__main__":
+    print("🔗 Resolving customer names")
+    print("="*80)
+    start = time.perf_counter()
+    stats = {}
+
+    args = sys.argv[1:]
+
+    def build(conn):
+        # A cleared override only takes effect on recomputed names, so rebuild
+        if '--override' in args:
+            i = args.index('--override')
+            set_override(conn, args[i + 1], args[i + 2])
+        if '--clear-override' in args:
+            set_override(conn, args[args.index('--clear-override') + 1])
+        stats.update(resolve_customers(conn, rebuild='--rebuild' in args
+                                       or '--clear-override' in args))
+
+    generation = db_swap.build_generation(DB_PATH, build)
+
+    print(f"   ✓ {stats['new_names']:,} new names indexed")
+    print(f"   ✓ {stats['names']:,} names → {stats['clusters']:,} customers")
+    print(f"   ✓ Done in {time.perf_counter() - start:.2f}s (generation {generation})")
+
+    conn = duckdb.connect(str(DB_PATH), read_only=True)
+    merged = conn.execute("""
+        SELECT canonical_name, COUNT(*) AS variants, string_agg(raw_name, ' | ') AS names
+        FROM customer_canonical
+        GROUP BY canonical_name HAVING COUNT(*) > 1
+        ORDER BY variants DESC LIMIT 10
+    """).df()
+    if len(merged):
+        print("\n🧪 Largest merged customers:")
+        print(merged.to_string(index=False))
+    conn.close()
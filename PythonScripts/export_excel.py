@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Streaming Excel Export for WIP Analysis
+Writes DuckDB query results straight into an .xlsx file in batches, using
+XlsxWriter's constant-memory mode, so memory stays flat however many rows
+are exported. No DataFrame is built.
+
+Results larger than Excel's row limit continue on extra sheets
+("Sheet", "Sheet (2)", ...). Numbers and dates get Excel formats based on
+the DuckDB column type. Queries run in a datasets.connect_session(), so
+any registered table can be exported.
+
+Usage:
+    python3 export_excel.py                       # all query_wip.py reports
+    python3 export_excel.py out.xlsx              # same, custom filename
+    python3 export_excel.py out.xlsx "SELECT ..." # one custom query
+"""
+import re
+import sys
+import time
+
+import xlsxwriter
+
+import datasets
+import query_wip
+
+EXCEL_MAX_ROWS = 1_048_576
+BATCH_ROWS = 10_000
+MAX_COL_WIDTH = 50
+
+INT_TYPES = {'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT',
+             'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT', 'UHUGEINT'}
+FLOAT_TYPES = {'FLOAT', 'DOUBLE'}
+
+
+class SheetNamer:
+    """Excel-safe, unique sheet names (max 31 chars, no []:*?/\\)"""
+
+    def __init__(self):
+        self.used = set()
+
+    def __call__(self, name, part=1):
+        base = re.sub(r'[\[\]:*?/\\]', '_', str(name)).strip("'") or 'Sheet'
+        suffix = f" ({part})" if part > 1 else ''
+        candidate = base[:31 - len(suffix)] + suffix
+        n = 2
+        while candidate.lower() in self.used:
+            tag = f"~{n}{suffix}"
+            candidate = base[:31 - len(tag)] + tag
+            n += 1
+        self.used.add(candidate.lower())
+        return candidate
+
+
+def column_writers(workbook, types):
+    """(write method name, cell format) per column, from DuckDB types"""
+    formats = {}
+
+    def fmt(num_format):
+        if num_format not in formats:
+            formats[num_format] = workbook.add_format({'num_format': num_format})
+        return formats[num_format]
+
+    writers = []
+    for t in types:
+        t = str(t).upper()
+        decimal = re.match(r'DECIMAL\(\d+,\s*(\d+)\)', t)
+        if t in INT_TYPES:
+            writers.append(('write_number', fmt('#,##0')))
+        elif t in FLOAT_TYPES:
+            writers.append(('write_number', fmt('#,##0.00')))
+        elif decimal:
+            scale = int(decimal.group(1))
+            writers.append(('write_number',
+                            fmt('#,##0' + ('.' + '0' * scale if scale else ''))))
+        elif t == 'DATE':
+            writers.append(('write_datetime', fmt('yyyy-mm-dd')))
+        elif t.startswith('TIMESTAMP'):
+            writers.append(('write_datetime', fmt('yyyy-mm-dd hh:mm:ss')))
+        elif t == 'BOOLEAN':
+            writers.append(('write_boolean', None))
+        else:
+            # Written as text so values such as "=..." are never read as formulas
+            writers.append(('write_string', None))
+    return writers
+
+
+def export_query(workbook, conn, sql, sheet_name, namer, batch_rows=BATCH_ROWS):
+    """Stream one query into one or more sheets; returns rows written"""
+    rel = conn.sql(sql)
+    columns = rel.columns
+    writers = column_writers(workbook, rel.types)
+    header_fmt = workbook.add_format({'bold': True, 'bottom': 1})
+    widths = [min(max(len(c) + 2, 10), MAX_COL_WIDTH) for c in columns]
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+
+    def new_sheet(part):
+        ws = workbook.add_worksheet(namer(sheet_name, part))
+        # Column widths must be set before rows are flushed in constant-memory mode
+        for i, width in enumerate(widths):
+            ws.set_column(i, i, width)
+        ws.freeze_panes(1, 0)
+        for i, name in enumerate(columns):
+            ws.write_string(0, i, name, header_fmt)
+        return ws
+
+    def bind(ws):
+        return [(getattr(ws, method), method == 'write_string', cell_fmt)
+                for method, cell_fmt in writers]
+
+    part, total, row = 1, 0, 1
+    bound = bind(new_sheet(part))
+    while True:
+        batch = rel.fetchmany(batch_rows)
+        if not batch:
+            break
+        for values in batch:
+            if row > rows_per_sheet:
+                part += 1
+                bound = bind(new_sheet(part))
+                row = 1
+            for col, value in enumerate(values):
+                if value is None:
+                    continue
+                write, is_text, cell_fmt = bound[col]
+                if is_text and not isinstance(value, str):
+                    value = str(value)
+                write(row, col, value, cell_fmt)
+            row += 1
+        total += len(batch)
+    return total
+
+
+def export_queries(queries, xlsx_path, conn=None):
+    """
+    Export [(sheet_name, sql), ...] to one workbook, one sheet per query.
+    Returns [(sheet_name, rows), ...].
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = datasets.connect_session()
+    workbook = xlsxwriter.Workbook(xlsx_path, {'constant_memory': True,
+                                               'nan_inf_to_errors': True,
+                                               'remove_timezone': True})
+    namer = SheetNamer()
+    counts = []
+    try:
+        for sheet_name, sql in queries:
+            counts.append((sheet_name, export_query(workbook, conn, sql, sheet_name, namer)))
+    finally:
+        workbook.close()
+        if own_conn:
+            conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    xlsx_path = args[0] if args else '../AnalysisOut/WIP_Reports.xlsx'
+    if len(args) > 1:
+        queries = [('Query', " ".join(args[1:]))]
+    else:
+        queries = [(key, sql) for key, _, sql in query_wip.QUERIES]
+
+    print("📤 Exporting query results to Excel")
+    print("="*80)
+    start = time.perf_counter()
+    for sheet_name, rows in export_queries(queries, xlsx_path):
+        print(f"   ✓ {sheet_name:25s} {rows:>10,} rows")
+    print(f"\n✅ Saved to {xlsx_path} in {time.perf_counter() - start:.2f}s")
@@ -3,11 +3,13 @@
 Generate Charts for WIP Analysis Summary
 Creates professional visualizations for markdown embedding
 """
-import duckdb
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+import chart_data
+import datasets
+
 # Set professional style
 sns.set_theme(style="whitegrid")
 plt.rcParams['figure.figsize'] = (12, 6)
@@ -16,7 +18,7 @@ plt.rcParams['font.size'] = 10
 # Create output directory
 Path('../charts').mkdir(exist_ok=True)
 
-conn = duckdb.connect('../wip_analysis.duckdb', read_only=True)
+conn = datasets.connect_session()
 
 print("📊 Generating visualizations for WIP Analysis...")
 
@@ -44,21 +46,22 @@ print("   ✓ Saved: ../charts/01_regional_revenue.png")
 
 # CHART 2: Margin Distribution
 print("2. Margin distribution...")
-df = conn.execute("""
-    SELECT "Gross Profit %" * 100 as margin_pct
-    FROM wip 
-    WHERE "Gross Profit %" IS NOT NULL
-      AND "Revenue To Date" > 0
-      AND "Gross Profit %" BETWEEN -0.5 AND 1.5
-""").df()
+margin_where = """
+    "Gross Profit %" IS NOT NULL
+    AND "Revenue To Date" > 0
+    AND "Gross Profit %" BETWEEN -0.5 AND 1.5
+"""
+bins = chart_data.histogram(conn, '"Gross Profit %" * 100', -50, 150,
+                            bins=50, where=margin_where)
+median_val, = chart_data.quantiles(conn, '"Gross Profit %" * 100', [0.5],
+                                   where=margin_where)
 
 plt.figure(figsize=(12, 6))
-plt.hist(df['margin_pct'], bins=50, color='coral',
-         edgecolor='black', alpha=0.7)
+plt.stairs(bins['count'], list(bins['left']) + [bins['right'].iloc[-1]],
+           fill=True, color='coral', edgecolor='black', alpha=0.7)
 plt.xlabel('Margin (%)', fontsize=12, fontweight='bold')
 plt.ylabel('Number of Contracts', fontsize=12, fontweight='bold')
 plt.title('Contract Margin Distribution', fontsize=14, fontweight='bold')
-median_val = df['margin_pct'].median()
 plt.axvline(median_val, color='red', linestyle='--', linewidth=2,
             label=f'Median: {median_val:.1f}%')
 plt.axvline(30, color='green', linestyle='--', linewidth=2, alpha=0.7,
@@ -95,23 +98,29 @@ print("   ✓ Saved: ../charts/03_status_composition.png")
 
 # CHART 4: Revenue vs Margin Scatter
 print("4. Revenue vs margin correlation...")
-df = conn.execute("""
-    SELECT "Revenue To Date"/1000000 as revenue_m, 
-           "Gross Profit %" * 100 as margin_pct,
-           "Contract Status"
-    FROM wip 
-    WHERE "Revenue To Date" > 100000
-      AND "Gross Profit %" BETWEEN -0.5 AND 1.0
-      AND "Contract Status" IN ('Open', 'Soft-Closed')
-    LIMIT 1000
-""").df()
+# Binned in DuckDB over every matching contract. Revenue is heavily skewed,
+# so it is binned on a log scale; marker area ~ contracts per cell
+df = chart_data.grid_density(
+    conn, '"Revenue To Date"/1000000', '"Gross Profit %" * 100',
+    x_bins=60, y_bins=40, group='"Contract Status"', log_x=True,
+    where="""
+        "Revenue To Date" > 100000
+        AND "Gross Profit %" BETWEEN -0.5 AND 1.0
+        AND "Contract Status" IN ('Open', 'Soft-Closed')
+    """)
 
 plt.figure(figsize=(12, 8))
 colors_map = {'Open': 'blue', 'Soft-Closed': 'green'}
-for status in df['Contract Status'].unique():
-    subset = df[df['Contract Status'] == status]
-    plt.scatter(subset['revenue_m'], subset['margin_pct'],
-                alpha=0.5, label=status, s=30, c=colors_map.get(status, 'gray'))
+max_count = df['count'].max() if len(df) else 1
+for status in df['grp'].unique():
+    subset = df[df['grp'] == status]
+    plt.scatter(subset['x'], subset['y'], s=15 + 250 * subset['count'] / max_count,
+                alpha=0.5, label=status, c=colors_map.get(status, 'gray'))
+if len(df):
+    plt.xscale('log')
+else:
+    plt.text(0.5, 0.5, 'No Open/Soft-Closed contracts over $100K', ha='center',
+             va='center', transform=plt.gca().transAxes, fontsize=12)
 
 plt.xlabel('Revenue ($M)', fontsize=12, fontweight='bold')
 plt.ylabel('Gross Profit Margin (%)', fontsize=12, fontweight='bold')
@@ -119,7 +128,10 @@ plt.title('Revenue vs Margin Analysis', fontsize=14, fontweight='bold')
 plt.axhline(y=30, color='green', linestyle='--',
             alpha=0.7, label='Target: 30%')
 plt.axhline(y=0, color='red', linestyle='--', alpha=0.7, label='Break-even')
-plt.legend(fontsize=10)
+legend = plt.legend(fontsize=10)
+for handle in legend.legend_handles:
+    if hasattr(handle, 'set_sizes'):
+        handle.set_sizes([30])  # status markers at a fixed size, not the cell's
 plt.grid(alpha=0.3)
 plt.tight_layout()
 plt.savefig('../charts/04_revenue_vs_margin.png', dpi=150, bbox_inches='tight')
@@ -1,14 +1,155 @@
 #!/usr/bin/env python3
 """
 Pre-built Analytics Queries for WIP Analysis
-Run business-focused queries on the DuckDB database
+Run business-focused queries on the DuckDB database (every registered
+dataset is attached - see datasets.py)
+
+Usage:
+    python3 query_wip.py               # print all reports
+    python3 query_wip.py <output_dir>  # also save each report as <key>.csv
 """
-import duckdb
+import sys
+from pathlib import Path
+
+import datasets
 
-conn = duckdb.connect('../wip_analysis.duckdb', read_only=True)
+# (key, title, sql) - key names the saved CSV / export sheet
+QUERIES = [
+    # Query 1: Overall Portfolio Health
+    ("portfolio_health", "Portfolio Health by Contract Status", """
+        SELECT 
+            "Contract Status",
+            COUNT(*) as contracts,
+            ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
+            ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
+            ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
+        FROM wip
+        WHERE "Contract Status" NOT IN ('InterCo Elim', 'ASC 606 Adjustment')
+        GROUP BY "Contract Status"
+        ORDER BY revenue_m DESC
+    """),
+    # Query 2: Margin Distribution Analysis
+    ("margin_distribution", "Margin Distribution Analysis", """
+        SELECT 
+            CASE 
+                WHEN "Gross Profit %" < 0 THEN 'Loss (< 0%)'
+                WHEN "Gross Profit %" < 0.15 THEN 'Low (0-15%)'
+                WHEN "Gross Profit %" < 0.30 THEN 'Medium (15-30%)'
+                ELSE 'High (> 30%)'
+            END as margin_bucket,
+            COUNT(*) as contracts,
+            ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
+        FROM wip
+        WHERE "Revenue To Date" > 0
+        GROUP BY margin_bucket
+        ORDER BY 
+            CASE margin_bucket
+                WHEN 'Loss (< 0%)' THEN 1
+                WHEN 'Low (0-15%)' THEN 2
+                WHEN 'Medium (15-30%)' THEN 3
+                ELSE 4
+            END
+    """),
+    # Query 3: At-Risk Contracts
+    ("at_risk", "⚠️  At-Risk Contracts (Open, Low Margin, >$100K)", """
+        SELECT 
+            Contract,
+            "Customer Name",
+            Region,
+            "PM Name",
+            ROUND("Revenue To Date"/1000000, 2) as revenue_m,
+            ROUND("Gross Profit %" * 100, 1) as margin_pct,
+            ROUND("% Complete" * 100, 1) as complete_pct
+        FROM wip
+        WHERE "Contract Status" = 'Open'
+          AND "Gross Profit %" < 0.15
+          AND "Revenue To Date" > 100000
+        ORDER BY "Revenue To Date" DESC
+        LIMIT 20
+    """),
+    # Query 4: Regional Performance Comparison
+    ("regional", "Regional Performance Comparison", """
+        SELECT 
+            Region,
+            COUNT(*) as contracts,
+            ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
+            ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
+            ROUND(SUM("Backlog Revenue")/1000000, 2) as backlog_m
+        FROM wip
+        WHERE Region IS NOT NULL
+          AND "Contract Status" NOT IN ('InterCo Elim')
+        GROUP BY Region
+        ORDER BY revenue_m DESC
+    """),
+    # Query 5: Top Customers by Revenue (spelling variants merged via
+    # customer_canonical, built by dedup_customers.py)
+    ("top_customers", "Top 15 Customers by Revenue", """
+        SELECT 
+            COALESCE(c.canonical_name, w."Customer Name") as "Customer Name",
+            COUNT(*) as contracts,
+            ROUND(SUM(w."Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(AVG(w."Gross Profit %") * 100, 1) as avg_margin_pct
+        FROM wip w
+        LEFT JOIN customer_canonical c ON c.raw_name = w."Customer Name"
+        WHERE w."Customer Name" IS NOT NULL
+          AND w."Revenue To Date" > 0
+        GROUP BY 1
+        ORDER BY revenue_m DESC
+        LIMIT 15
+    """),
+    # Query 6: Service Type Analysis
+    ("service_type", "Service Type Performance", """
+        SELECT 
+            ServiceType,
+            COUNT(*) as contracts,
+            ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
+            ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
+        FROM wip
+        WHERE ServiceType IS NOT NULL
+          AND "Revenue To Date" > 0
+        GROUP BY ServiceType
+        ORDER BY revenue_m DESC
+    """),
+    # Query 7: PM Performance Leaderboard
+    ("pm_leaderboard", "Top 20 Project Managers (≥5 contracts)", """
+        SELECT 
+            "PM Name",
+            COUNT(*) as contracts,
+            ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+            ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
+            ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct
+        FROM wip
+        WHERE "PM Name" IS NOT NULL
+          AND "Revenue To Date" > 0
+        GROUP BY "PM Name"
+        HAVING COUNT(*) >= 5
+        ORDER BY revenue_m DESC
+        LIMIT 20
+    """),
+    # Query 8: Large Projects (>$5M revenue)
+    ("large_projects", "Large Projects (>$5M Revenue)", """
+        SELECT 
+            Contract,
+            Description,
+            "Customer Name",
+            Region,
+            ROUND("Revenue To Date"/1000000, 2) as revenue_m,
+            ROUND("Gross Profit %" * 100, 1) as margin_pct,
+            ROUND("% Complete" * 100, 1) as complete_pct,
+            "Contract Status"
+        FROM wip
+        WHERE "Revenue To Date" > 5000000
+        ORDER BY "Revenue To Date" DESC
+        LIMIT 20
+    """),
+]
 
 
-def run_query(query, title):
+def run_query(conn, query, title):
     print(f"\n{'='*80}")
     print(f"📊 {title}")
     print('='*80)
@@ -18,146 +159,24 @@ def run_query(query, title):
     return result
 
 
-# Query 1: Overall Portfolio Health
-run_query("""
-    SELECT 
-        "Contract Status",
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
-        ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
-        ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
-    FROM wip
-    WHERE "Contract Status" NOT IN ('InterCo Elim', 'ASC 606 Adjustment')
-    GROUP BY "Contract Status"
-    ORDER BY revenue_m DESC
-""", "Portfolio Health by Contract Status")
-
-# Query 2: Margin Distribution Analysis
-run_query("""
-    SELECT 
-        CASE 
-            WHEN "Gross Profit %" < 0 THEN 'Loss (< 0%)'
-            WHEN "Gross Profit %" < 0.15 THEN 'Low (0-15%)'
-            WHEN "Gross Profit %" < 0.30 THEN 'Medium (15-30%)'
-            ELSE 'High (> 30%)'
-        END as margin_bucket,
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
-    FROM wip
-    WHERE "Revenue To Date" > 0
-    GROUP BY margin_bucket
-    ORDER BY 
-        CASE margin_bucket
-            WHEN 'Loss (< 0%)' THEN 1
-            WHEN 'Low (0-15%)' THEN 2
-            WHEN 'Medium (15-30%)' THEN 3
-            ELSE 4
-        END
-""", "Margin Distribution Analysis")
-
-# Query 3: At-Risk Contracts
-run_query("""
-    SELECT 
-        Contract,
-        "Customer Name",
-        Region,
-        "PM Name",
-        ROUND("Revenue To Date"/1000000, 2) as revenue_m,
-        ROUND("Gross Profit %" * 100, 1) as margin_pct,
-        ROUND("% Complete" * 100, 1) as complete_pct
-    FROM wip
-    WHERE "Contract Status" = 'Open'
-      AND "Gross Profit %" < 0.15
-      AND "Revenue To Date" > 100000
-    ORDER BY "Revenue To Date" DESC
-    LIMIT 20
-""", "⚠️  At-Risk Contracts (Open, Low Margin, >$100K)")
-
-# Query 4: Regional Performance Comparison
-run_query("""
-    SELECT 
-        Region,
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
-        ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
-        ROUND(SUM("Backlog Revenue")/1000000, 2) as backlog_m
-    FROM wip
-    WHERE Region IS NOT NULL
-      AND "Contract Status" NOT IN ('InterCo Elim')
-    GROUP BY Region
-    ORDER BY revenue_m DESC
-""", "Regional Performance Comparison")
-
-# Query 5: Top Customers by Revenue
-run_query("""
-    SELECT 
-        "Customer Name",
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct
-    FROM wip
-    WHERE "Customer Name" IS NOT NULL
-      AND "Revenue To Date" > 0
-    GROUP BY "Customer Name"
-    ORDER BY revenue_m DESC
-    LIMIT 15
-""", "Top 15 Customers by Revenue")
-
-# Query 6: Service Type Analysis
-run_query("""
-    SELECT 
-        ServiceType,
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct,
-        ROUND(AVG("% Complete") * 100, 1) as avg_complete_pct
-    FROM wip
-    WHERE ServiceType IS NOT NULL
-      AND "Revenue To Date" > 0
-    GROUP BY ServiceType
-    ORDER BY revenue_m DESC
-""", "Service Type Performance")
-
-# Query 7: PM Performance Leaderboard
-run_query("""
-    SELECT 
-        "PM Name",
-        COUNT(*) as contracts,
-        ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-        ROUND(SUM("Gross Profit")/1000000, 2) as profit_m,
-        ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct
-    FROM wip
-    WHERE "PM Name" IS NOT NULL
-      AND "Revenue To Date" > 0
-    GROUP BY "PM Name"
-    HAVING COUNT(*) >= 5
-    ORDER BY revenue_m DESC
-    LIMIT 20
-""", "Top 20 Project Managers (≥5 contracts)")
+def run_all(output_dir=None):
+    """Run every pre-built query, optionally saving results as CSV"""
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+    conn = datasets.connect_session()
+    try:
+        for key, title, query in QUERIES:
+            result = run_query(conn, query, title)
+            if output_dir:
+                result.to_csv(Path(output_dir) / f"{key}.csv", index=False)
+    finally:
+        conn.close()
 
-# Query 8: Large Projects (>$5M revenue)
-run_query("""
-    SELECT 
-        Contract,
-        Description,
-        "Customer Name",
-        Region,
-        ROUND("Revenue To Date"/1000000, 2) as revenue_m,
-        ROUND("Gross Profit %" * 100, 1) as margin_pct,
-        ROUND("% Complete" * 100, 1) as complete_pct,
-        "Contract Status"
-    FROM wip
-    WHERE "Revenue To Date" > 5000000
-    ORDER BY "Revenue To Date" DESC
-    LIMIT 20
-""", "Large Projects (>$5M Revenue)")
 
-conn.close()
+if __name__ == "__main__":
+    run_all(output_dir=sys.argv[1] if len(sys.argv) > 1 else None)
 
-print("\n" + "="*80)
-print("✅ All queries completed successfully")
-print("="*80)
-print("\n💡 For custom queries, use: python3 custom_query.py")
+    print("\n" + "="*80)
+    print("✅ All queries completed successfully")
+    print("="*80)
+    print("\n💡 For custom queries, use: python3 custom_query.py")
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+WIP Analysis Pipeline Runner
+Runs setup → queries → charts → summary as a dependency graph.
+
+Each step declares the files it reads and writes. A step is re-run only when
+the content hash of its inputs (or of its own script) differs from the last
+successful run, or when one of its outputs is missing or was modified.
+Independent steps run in parallel.
+
+The databases are also written outside the pipeline (watch_filesin.py,
+dedup_customers.py --override), so setup is judged by the workbook versions
+they hold (table _ingested), not by their file hashes: it re-runs only when
+a workbook changed and was not loaded yet. Queries and charts read the
+databases and re-run whenever their content changes.
+
+Usage:
+    python3 run_pipeline.py            # run stale steps only
+    python3 run_pipeline.py --force    # re-run every step
+"""
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import datasets
+import query_wip
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+ROOT = SCRIPTS_DIR.parent
+
+# Every registered dataset is loaded by the setup step
+WORKBOOKS = sorted({path for spec in datasets.DATASETS.values()
+                    for path in datasets.source_files(spec)})
+DB_FILES = sorted({spec['db'] for spec in datasets.DATASETS.values() if 'db' in spec})
+RESULTS_DIR = ROOT / 'AnalysisOut' / 'query_results'
+SUMMARY_FILE = ROOT / 'AnalysisOut' / 'WIP_Pipeline_Summary.md'
+STATE_FILE = ROOT / '.pipeline_state.json'
+RUN_LOG = ROOT / 'AnalysisOut' / 'pipeline_runs.jsonl'
+
+CHARTS = [
+    ('Regional Revenue', ROOT / 'charts' / '01_regional_revenue.png'),
+    ('Margin Distribution', ROOT / 'charts' / '02_margin_distribution.png'),
+    ('Status Composition', ROOT / 'charts' / '03_status_composition.png'),
+    ('Revenue vs Margin', ROOT / 'charts' / '04_revenue_vs_margin.png'),
+    ('Service Type', ROOT / 'charts' / '05_service_type.png'),
+    ('Completion Status', ROOT / 'charts' / '06_completion_status.png'),
+]
+QUERY_RESULTS = [RESULTS_DIR / f"{key}.csv" for key, _, _ in query_wip.QUERIES]
+
+
+class Step:
+    """One node of the pipeline graph"""
+
+    def __init__(self, name, action, inputs, outputs, deps=(), code=(), loaded=None):
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.code = list(code)
+        # For outputs also written outside the pipeline: callable returning
+        # {input path: digest} of the input versions the outputs hold
+        self.loaded = loaded
+
+
+def run_script(script, *args):
+    """Run one of the existing scripts from the PythonScripts directory"""
+    def action():
+        proc = subprocess.run([sys.executable, script, *args], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"{script} exited with {proc.returncode}:\n{proc.stderr.strip()}")
+    return action
+
+
+def loaded_workbooks():
+    """{workbook path: digest} held by the stored datasets (None if they disagree)"""
+    held = {}
+    for name in datasets.stored_datasets():
+        source = datasets.DATASETS[name]['source']
+        folder = source if source.is_dir() else source.parent
+        for source_file, (digest, _) in datasets.ingested(name).items():
+            key = str(folder / source_file)
+            held[key] = digest if held.get(key, digest) == digest else None
+    return held
+
+
+def md_table(df):
+    """Render a DataFrame as a GitHub markdown table"""
+    lines = ['| ' + ' | '.join(str(c) for c in df.columns) + ' |',
+             '|' + '---|' * len(df.columns)]
+    for row in df.itertuples(index=False):
+        cells = ['' if pd.isna(v) else str(v) for v in row]
+        lines.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(lines)
+
+
+def write_summary():
+    """Assemble query results and charts into the pipeline summary"""
+    parts = ["# WIP Analysis - Pipeline Summary", "",
+             f"**Source:** {', '.join(str(p.relative_to(ROOT)) for p in WORKBOOKS)}  ",
+             f"**Databases:** {', '.join(p.name for p in DB_FILES)}  ",
+             f"**Generated:** {datetime.now():%Y-%m-%d %H:%M}", "",
+             "---", "", "## 📈 Charts", ""]
+    for title, path in CHARTS:
+        rel = Path('..') / path.relative_to(ROOT)
+        parts += [f"### {title}", "", f"![{title}]({rel.as_posix()})", ""]
+    parts += ["---", "", "## 📊 Reports", ""]
+    for (key, title, _), path in zip(query_wip.QUERIES, QUERY_RESULTS):
+        df = pd.read_csv(path)
+        parts += [f"### {title}", "", md_table(df), "",
+                  f"*{len(df)} rows*", ""]
+    SUMMARY_FILE.write_text('\n'.join(parts))
+
+
+STEPS = [
+    Step('setup', run_script('datasets.py'),
+         inputs=WORKBOOKS, outputs=DB_FILES, loaded=loaded_workbooks,
+         code=[SCRIPTS_DIR / 'datasets.py', SCRIPTS_DIR / 'db_swap.py',
+               SCRIPTS_DIR / 'dedup_customers.py']),
+    Step('queries', run_script('query_wip.py', str(RESULTS_DIR)),
+         inputs=DB_FILES, outputs=QUERY_RESULTS, deps=['setup'],
+         code=[SCRIPTS_DIR / 'query_wip.py', SCRIPTS_DIR / 'datasets.py']),
+    Step('charts', run_script('generate_charts.py'),
+         inputs=DB_FILES, outputs=[path for _, path in CHARTS], deps=['setup'],
+         code=[SCRIPTS_DIR / 'generate_charts.py', SCRIPTS_DIR / 'chart_data.py',
+               SCRIPTS_DIR / 'datasets.py']),
+    Step('summary', write_summary,
+         inputs=QUERY_RESULTS + [path for _, path in CHARTS],
+         outputs=[SUMMARY_FILE], deps=['queries', 'charts'],
+         code=[Path(__file__).resolve()]),
+]
+
+
+class HashCache:
+    """sha256 of file contents, reused while size and mtime are unchanged"""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def digest(self, path):
+        path = Path(path)
+        if not path.exists():
+            return None
+        st = path.stat()
+        key = str(path)
+        cached = self.entries.get(key)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['sha256']
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        self.entries[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                             'sha256': h.hexdigest()}
+        return h.hexdigest()
+
+
+def load_state():
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {'hashes': {}, 'steps': {}}
+
+
+def signature(step, cache, paths=None):
+    """Combined hash of a step's script(s) and input files (or just `paths`)"""
+    h = hashlib.sha256()
+    for path in step.code + step.inputs if paths is None else paths:
+        h.update(str(path).encode())
+        h.update((cache.digest(path) or 'missing').encode())
+    return h.hexdigest()
+
+
+def is_stale(step, record, sig, cache):
+    if record is None:
+        return True
+    if step.loaded is None:
+        return record['signature'] != sig or any(
+            cache.digest(p) != record['outputs'].get(str(p)) for p in step.outputs)
+
+    if (record.get('code') != signature(step, cache, step.code)
+            or not all(Path(p).exists() for p in step.outputs)):
+        return True
+    # An input is up to date if the outputs hold its current version, or if
+    # it has not changed since the last run (e.g. a workbook the loader rejected)
+    loaded = step.loaded()
+    inputs = {str(p): cache.digest(p) for p in step.inputs}
+    return bool(set(loaded) - set(inputs)) or any(
+        digest not in (loaded.get(path), record.get('inputs', {}).get(path))
+        for path, digest in inputs.items())
+
+
+def run_pipeline(steps=STEPS, force=False, max_workers=4):
+    """Run stale steps in dependency order, independent steps in parallel"""
+    state = load_state()
+    cache = HashCache(state['hashes'])
+    by_name = {s.name: s for s in steps}
+    results = {}
+    pending = dict(by_name)
+    running = {}
+    started = time.perf_counter()
+
+    def execute(step):
+        t0 = time.perf_counter()
+        sig = signature(step, cache)
+        if not force and not is_stale(step, state['steps'].get(step.name), sig, cache):
+            return 'skipped', time.perf_counter() - t0
+        step.action()
+        missing = [str(p) for p in step.outputs if not Path(p).exists()]
+        if missing:
+            raise RuntimeError(f"outputs not produced: {', '.join(missing)}")
+        state['steps'][step.name] = {
+            'signature': sig,
+            'code': signature(step, cache, step.code),
+            'inputs': {str(p): cache.digest(p) for p in step.inputs},
+            'outputs': {str(p): cache.digest(p) for p in step.outputs},
+        }
+        return 'ran', time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, step in list(pending.items()):
+                dep_status = [results.get(d, {}).get('status') for d in step.deps]
+                if any(s in ('failed', 'blocked') for s in dep_status):
+                    results[name] = {'status': 'blocked', 'seconds': 0.0}
+                    del pending[name]
+                elif all(s in ('ran', 'skipped') for s in dep_status):
+                    running[pool.submit(execute, step)] = name
+                    del pending[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status, seconds = future.result()
+                    results[name] = {'status': status, 'seconds': round(seconds, 3)}
+                except Exception as e:
+                    results[name] = {'status': 'failed', 'seconds': 0.0,
+                                     'error': str(e)}
+
+    STATE_FILE.write_text(json.dumps(state, indent=2))
+    total = time.perf_counter() - started
+    RUN_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(RUN_LOG, 'a') as f:
+        f.write(json.dumps({'started': datetime.now().isoformat(timespec='seconds'),
+                            'force': force, 'seconds': round(total, 3),
+                            'steps': results}) + '\n')
+    return results, total
+
+
+if __name__ == "__main__":
+    print("🔁 WIP Analysis Pipeline")
+    print("="*80)
+    results, total = run_pipeline(force='--force' in sys.argv[1:])
+
+    icons = {'ran': '✓', 'skipped': '·', 'failed': '❌', 'blocked': '⏸'}
+    for step in STEPS:
+        r = results[step.name]
+        print(f"   {icons[r['status']]} {step.name:10s} {r['status']:8s} {r['seconds']:7.2f}s")
+        if 'error' in r:
+            print(f"      {r['error']}")
+
+    ok = all(r['status'] in ('ran', 'skipped') for r in results.values())
+    print(f"\n✅ Finished in {total:.2f}s" if ok
+          else f"\n❌ Pipeline failed after {total:.2f}s")
+    print(f"   Run log: {RUN_LOG.relative_to(ROOT)}")
+    print(f"   Summary: {SUMMARY_FILE.relative_to(ROOT)}")
+    sys.exit(0 if ok else 1)
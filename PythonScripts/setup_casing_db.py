@@ -1,38 +1,26 @@
 #!/usr/bin/env python3
-import pandas as pd
-import duckdb
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
-print("🦆 Setting up DuckDB for Casing WIP Analysis")
-print("="*80)
+import datasets
+import db_swap
 
-# Load Excel with proper headers
-print("\n📥 Loading Excel file...")
-file_path = 'FilesIn/casing.xlsx'
-df = pd.read_excel(file_path, sheet_name='WIP - P10', header=1)
-print(f"   ✓ Loaded {len(df):,} records with {len(df.columns)} columns")
+# Workbook, sheet and date columns are declared in the registry (datasets.py)
+spec = datasets.DATASETS['casing']
 
-# Clean up data types for DuckDB compatibility
-print("\n🧹 Cleaning data types...")
-date_cols = ['WIPMth', 'Start Month', 'MonthClosed',
-             'Dispatcher Start Date', 'Dispatcher End Date']
-for col in date_cols:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-        print(f"   ✓ Converted {col} to datetime")
+print("🦆 Setting up DuckDB for Casing WIP Analysis")
+print("="*80)
 
-# Create DuckDB connection (persistent to disk)
-print("\n🔧 Creating DuckDB connection...")
-conn = duckdb.connect('casing_analysis.duckdb')
-print("   ✓ Connected to casing_analysis.duckdb")
+# casing_wip is a view over the wip table, so loading it loads wip
+print(f"\n📥 Loading registered dataset '{spec['view_of']}' (casing_wip is a view over it)...")
+try:
+    datasets.load(['casing'], allow_shrink='--allow-shrink' in sys.argv[1:])
+except db_swap.ValidationError as e:
+    print(f"\n❌ Rejected, live database unchanged: {e}")
+    sys.exit(1)
 
-# Register and create table
-print("\n📊 Creating table in DuckDB...")
-conn.execute("DROP TABLE IF EXISTS casing_wip")
-conn.register('df_view', df)
-conn.execute("CREATE TABLE casing_wip AS SELECT * FROM df_view")
-print("   ✓ Table 'casing_wip' created successfully")
+conn = datasets.connect_session(['casing'])
 
 # Verify
 row_count = conn.execute("SELECT COUNT(*) FROM casing_wip").fetchone()[0]
@@ -86,9 +74,9 @@ print(result.to_string(index=False))
 
 conn.close()
 print("\n" + "="*80)
-print("✅ Database created and saved to: casing_analysis.duckdb")
+print(f"✅ casing_wip available from: {datasets.DATASETS[spec['view_of']]['db']}")
 print("\n📋 Quick Start:")
-print("   import duckdb")
-print("   conn = duckdb.connect('casing_analysis.duckdb')")
+print("   import datasets")
+print("   conn = datasets.connect_session()   # wip and casing_wip together")
 print("   result = conn.execute('SELECT * FROM casing_wip LIMIT 10').df()")
 print("="*80)
@@ -1,66 +1,69 @@
 #!/usr/bin/env python3
 """
 DuckDB Setup for WIP (Work in Progress) Analysis
-Loads casing.xlsx into a persistent DuckDB database for SQL querying
+Loads the WIP workbooks in FilesIn/ into a persistent DuckDB database for
+SQL querying
+
+The source folder, sheet and date columns are declared in datasets.py,
+whose loader does the work: the database is rebuilt through db_swap, so
+readers can keep querying the previous generation while a reload runs.
+Use `python3 datasets.py` to load every registered dataset in one pass.
+
+Usage:
+    python3 setup_duckdb.py                 # reload wip
+    python3 setup_duckdb.py --allow-shrink  # accept far fewer rows than before
 """
-import pandas as pd
-import duckdb
-from pathlib import Path
+import sys
 
-print("🦆 Setting up DuckDB for WIP Analysis")
-print("="*80)
+import duckdb
 
-# Load Excel with proper headers
-print("\n📥 Loading Excel file...")
-file_path = '../FilesIn/casing.xlsx'
-df = pd.read_excel(file_path, sheet_name='WIP - P10', header=1)
-print(f"   ✓ Loaded {len(df):,} records with {len(df.columns)} columns")
+import datasets
+import db_swap
 
-# Clean up data types for DuckDB compatibility
-print("\n🧹 Cleaning data types...")
-date_cols = ['WIPMth', 'Start Month', 'MonthClosed', 'Start Date']
-for col in date_cols:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
+DATASET = 'wip'
+DB_PATH = datasets.DATASETS[DATASET]['db']
+TABLE = datasets.DATASETS[DATASET]['table']
 
-# Handle any problematic column names (spaces, special chars are OK in DuckDB)
-print("   ✓ Date columns converted")
 
-# Create DuckDB connection (persistent to disk)
-print("\n🔧 Creating DuckDB connection...")
-db_path = '../wip_analysis.duckdb'
-conn = duckdb.connect(db_path)
-print(f"   ✓ Connected to {db_path}")
+if __name__ == "__main__":
+    print("🦆 Setting up DuckDB for WIP Analysis")
+    print("="*80)
 
-# Register and create table
-print("\n📊 Creating table in DuckDB...")
-conn.execute("DROP TABLE IF EXISTS wip")
-conn.register('df_view', df)
-conn.execute("CREATE TABLE wip AS SELECT * FROM df_view")
-print("   ✓ Table 'wip' created successfully")
+    # The registry's loader parses the workbook, builds a new database
+    # generation against a private copy, validates it and swaps it in
+    # atomically, so readers are never blocked. Customer name mapping is
+    # refreshed in the same generation.
+    print("\n📥 Loading registered dataset 'wip'...")
+    try:
+        datasets.load([DATASET], allow_shrink='--allow-shrink' in sys.argv[1:])
+    except db_swap.ValidationError as e:
+        print(f"\n❌ Rejected, live database unchanged: {e}")
+        sys.exit(1)
 
-# Verify
-row_count = conn.execute("SELECT COUNT(*) FROM wip").fetchone()[0]
-print(f"   ✓ Verified: {row_count:,} rows in table")
+    # Verify
+    conn = duckdb.connect(str(DB_PATH), read_only=True)
+    row_count = conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+    print(f"   ✓ Verified: {row_count:,} rows in table")
 
-# Run a test query
-print("\n🧪 Test Query: Regional Performance")
-result = conn.execute("""
-    SELECT Region, 
-           COUNT(*) as contracts,
-           ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
-           ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct
-    FROM wip
-    WHERE Region IS NOT NULL
-    GROUP BY Region
-    ORDER BY revenue_m DESC
-    LIMIT 10
-""").df()
-print(result.to_string(index=False))
+    # Run a test query
+    print("\n🧪 Test Query: Regional Performance")
+    result = conn.execute("""
+        SELECT Region,
+               COUNT(*) as contracts,
+               ROUND(SUM("Revenue To Date")/1000000, 2) as revenue_m,
+               ROUND(AVG("Gross Profit %") * 100, 1) as avg_margin_pct
+        FROM wip
+        WHERE Region IS NOT NULL
+        GROUP BY Region
+        ORDER BY revenue_m DESC
+        LIMIT 10
+    """).df()
+    print(result.to_string(index=False))
 
-conn.close()
-print("\n✅ Database saved to: ../wip_analysis.duckdb")
-print("\n💡 Next steps:")
-print("   - Run pre-built queries: python3 PythonScripts/query_wip.py")
-print("   - Custom queries: python3 PythonScripts/custom_query.py")
-print("   - Interactive Python: import duckdb; conn = duckdb.connect('wip_analysis.duckdb')")
+    conn.close()
+    print(f"\n✅ Database saved to: {DB_PATH}")
+    print("\n💡 Next steps:")
+    print("   - Run pre-built queries: python3 PythonScripts/query_wip.py")
+    print("   - Custom queries: python3 PythonScripts/custom_query.py")
+    print("   - Watch FilesIn/ for new workbooks: python3 PythonScripts/watch_filesin.py")
+    print("   - Interactive Python: import datasets; conn = datasets.connect_session()")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Watch-Folder Ingest for WIP Analysis
+Keeps the registered datasets (datasets.py) up to date as workbooks land in
+FilesIn/.
+
+- Change detection uses inotify through the optional `watchdog` package,
+  falling back to polling the folder when it is not installed.
+- A file is only picked up once its size and mtime have been stable for
+  SETTLE_SECONDS, so half-copied files are skipped until they finish. A
+  settled file that is still not a valid .xlsx (corrupt, a copy that
+  stalled, or password-protected) is rejected and logged.
+- Each workbook is identified by content hash. The hashes of the loaded
+  versions are stored in the database (table _ingested, written by the full
+  loader too), so re-saved but unchanged files are ignored and a full
+  reload never hides a workbook from the watcher.
+- Workbooks are parsed on a pool of MAX_WORKERS background processes.
+  Each workbook is loaded into every stored dataset whose source covers it
+  (view datasets such as casing_wip follow automatically), replacing only
+  that workbook's rows; removing it from its folder deletes them. customer_canonical is then refreshed. Each
+  batch is built as a new generation (db_swap) of each affected database
+  and swapped in, so readers are never blocked.
+- A workbook without a dataset's required columns, one with far fewer rows
+  than its previous version (more than db_swap.MAX_SHRINK fewer, including
+  none at all, which looks like truncation), a batch that would shrink a
+  table that much, or a workbook that fails to load, is rejected for
+  that dataset and logged on its own; the rest of its batch still loads.
+  It is retried once it changes.
+
+Usage:
+    python3 watch_filesin.py          # run until Ctrl+C
+    python3 watch_filesin.py --once   # ingest anything new, then exit
+    python3 watch_filesin.py --allow-shrink   # accept truncated-looking workbooks
+"""
+import json
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+
+import datasets
+import db_swap
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+STORED = datasets.stored_datasets()
+WATCH_DIRS = sorted({spec['source'] if spec['source'].is_dir() else spec['source'].parent
+                     for spec in (datasets.DATASETS[name] for name in STORED)})
+# Workbook versions that were rejected, keyed "<dataset>/<workbook>", so they
+# are not retried until they change (what has been ingested is recorded in
+# each database itself, table _ingested)
+STATE_FILE = datasets.ROOT / '.ingest_rejected.json'
+
+SETTLE_SECONDS = 2.0
+POLL_SECONDS = 1.0
+FULL_SCAN_SECONDS = 30
+MAX_WORKERS = 2
+
+
+def parse_workbook(path):
+    """
+    Runs in a worker process: {dataset: DataFrame} for every stored dataset
+    loaded from path, parsing each (sheet, header row) once
+    """
+    sheets = {}
+    frames = {}
+    for name in datasets.targets(path):
+        spec = datasets.DATASETS[name]
+        key = (spec['sheet'], spec['header'])
+        if key not in sheets:
+            sheets[key] = datasets.read_sheet(path, *key)
+        frames[name] = datasets.prepare(sheets[key], spec)
+    return frames
+
+
+class FolderWatcher:
+    """Tracks candidate files until they have settled"""
+
+    def __init__(self, folders):
+        self.folders = folders
+        self.seen = {}        # path -> (size, mtime_ns, first time seen at that size/mtime)
+        self.dirty = set()    # paths reported by inotify since the last check
+        self.observer = None
+
+    def start(self):
+        if Observer is None:
+            print("   · watchdog not installed - polling every "
+                  f"{POLL_SECONDS:.0f}s (pip install watchdog for inotify)")
+            return
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for attr in ('src_path', 'dest_path'):
+                    p = getattr(event, attr, None)
+                    if p and datasets.is_workbook(p):
+                        watcher.dirty.add(Path(p))
+
+        self.observer = Observer()
+        for folder in self.folders:
+            self.observer.schedule(Handler(), str(folder), recursive=False)
+        self.observer.start()
+        print("   · Watching with inotify")
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+
+    def candidates(self, full_scan):
+        if full_scan or self.observer is None:
+            paths = {p for name in STORED
+                     for p in datasets.source_files(datasets.DATASETS[name])}
+        else:
+            paths = set(self.dirty)
+        self.dirty -= paths
+        return {p for p in paths | set(self.seen) if datasets.is_workbook(p)}
+
+    def settled(self, full_scan=False):
+        """Paths whose size and mtime have not changed for SETTLE_SECONDS"""
+        now = time.monotonic()
+        ready = []
+        for path in self.candidates(full_scan):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                self.seen.pop(path, None)
+                continue
+            key = (st.st_size, st.st_mtime_ns)
+            prev = self.seen.get(path)
+            if prev is None or prev[:2] != key:
+                self.seen[path] = key + (now,)
+            elif now - prev[2] >= SETTLE_SECONDS:
+                ready.append(path)
+                del self.seen[path]
+        return ready
+
+
+def load_state():
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text())
+    return {}
+
+
+def save_state(state):
+    STATE_FILE.write_text(json.dumps(state, indent=2))
+
+
+def write_changes(db_path, changes, allow_shrink=False):
+    """
+    Apply changes [(dataset, path, digest, df or None if removed)] to one
+    database in one new generation, then refresh aggregates
+    """
+    names = list(dict.fromkeys(name for name, _, _, _ in changes))
+    removed = {}
+    for name, path, _, df in changes:
+        if df is None:
+            removed.setdefault(name, []).append(path.name)
+
+    def build(conn):
+        # The build starts from a copy of the live generation
+        previous = {name: datasets.previous_rows(conn, name, removed.get(name, ()))
+                    for name in names}
+        for name, path, digest, df in changes:
+            table = datasets.DATASETS[name]['table']
+            if df is None:
+                datasets.delete_workbook(conn, table, path.name)
+                datasets.record_ingest(conn, name, path.name)
+                print(f"   ✓ {name}: {path.name} no longer in {path.parent.name}/ - rows deleted")
+                continue
+            t0 = time.perf_counter()
+            rows, ignored = datasets.ingest_workbook(conn, df, table, path.name)
+            datasets.record_ingest(conn, name, path.name, digest, rows)
+            print(f"   ✓ {name}: {path.name} {rows:,} rows in {time.perf_counter() - t0:.2f}s")
+            if ignored:
+                print(f"      · new columns not loaded ({', '.join(map(str, ignored))})"
+                      " - run datasets.py to add them")
+        datasets.validate(conn, names, previous,
+                          None if allow_shrink else db_swap.MAX_SHRINK)
+        datasets.refresh_derived(conn, names)
+
+    generation = db_swap.build_generation(db_path, build)
+    print(f"   ✓ {db_path.name}: swapped in generation {generation}")
+
+
+def apply_changes(changes, ingested, state, queued, allow_shrink=False):
+    """
+    write_changes for each affected database, falling back to one change at
+    a time when a batch fails so that one bad workbook cannot hold back the
+    others
+    """
+    by_db = {}
+    for change in changes:
+        by_db.setdefault(datasets.DATASETS[change[0]]['db'], []).append(change)
+
+    for db_path, db_changes in by_db.items():
+        try:
+            write_changes(db_path, db_changes, allow_shrink)
+        except (OSError, duckdb.IOException) as e:
+            print(f"   ❌ Write failed, will retry: {e}")
+            for _, path, digest, df in db_changes:
+                if df is not None and (path, digest) not in queued:
+                    queued.append((path, digest))
+            continue
+        except Exception as e:
+            if len(db_changes) > 1:
+                print(f"   ⚠️  Batch failed ({e}) - applying workbooks one at a time")
+                for change in db_changes:
+                    apply_changes([change], ingested, state, queued, allow_shrink)
+                continue
+            name, path, digest, _ = db_changes[0]
+            print(f"   ❌ {name}: {path.name} rejected, live database unchanged: {e}")
+            state[f"{name}/{path.name}"] = digest or 'removed'
+            save_state(state)
+            continue
+
+        for name, path, digest, df in db_changes:
+            if df is None:
+                ingested[name].pop(path.name, None)
+            else:
+                ingested[name][path.name] = (digest, len(df))
+            state.pop(f"{name}/{path.name}", None)
+        save_state(state)
+
+
+def check_parsed(path, digest, frames, ingested, state, allow_shrink):
+    """Changes for the datasets that accept this workbook version; rejects the rest"""
+    changes = []
+    for name, df in frames.items():
+        key = f"{name}/{path.name}"
+        if digest in (ingested[name].get(path.name, (None,))[0], state.get(key)):
+            continue
+        try:
+            datasets.check_columns(df, datasets.DATASETS[name], path.name)
+            if not allow_shrink:
+                db_swap.check_shrink(path.name, ingested[name].get(path.name, (None, 0))[1],
+                                     len(df))
+        except db_swap.ValidationError as e:
+            print(f"   ❌ {name}: {e}")
+            state[key] = digest  # don't retry until it changes again
+            save_state(state)
+            continue
+        changes.append((name, path, digest, df))
+    return changes
+
+
+def run(once=False, allow_shrink=False):
+    state = load_state()
+    watcher = FolderWatcher(WATCH_DIRS)
+    watcher.start()
+    pending = {}   # future -> (path, digest)
+    queued = []    # (path, digest) waiting for a free worker
+    ingested = {name: {} for name in STORED}
+    last_scan = None
+
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        try:
+            while True:
+                # Periodic full scan also catches anything inotify missed,
+                # and picks up loads done by anyone else (e.g. a full reload)
+                full_scan = last_scan is None or time.monotonic() - last_scan >= FULL_SCAN_SECONDS
+                changes = []
+                if full_scan:
+                    last_scan = time.monotonic()
+                    for name in STORED:
+                        spec = datasets.DATASETS[name]
+                        ingested[name] = datasets.ingested(name)
+                        present = {p.name for p in datasets.source_files(spec)}
+                        folder = spec['source'] if spec['source'].is_dir() else spec['source'].parent
+                        changes += [(name, folder / f, None, None) for f in ingested[name]
+                                    if f not in present and state.get(f"{name}/{f}") != 'removed']
+
+                for path in watcher.settled(full_scan):
+                    try:
+                        digest = datasets.file_digest(path)
+                    except OSError:
+                        continue  # gone again; the next scan notices
+                    busy = {p for p, _ in list(pending.values()) + queued}
+                    stale = [name for name in datasets.targets(path)
+                             if digest not in (ingested[name].get(path.name, (None,))[0],
+                                               state.get(f"{name}/{path.name}"))]
+                    if not stale or path in busy:
+                        continue
+                    if not zipfile.is_zipfile(path):
+                        print(f"\n❌ {datetime.now():%H:%M:%S} {path.name}: not a valid .xlsx "
+                              "(corrupt, incomplete or password-protected) - skipped until it changes")
+                        for name in stale:
+                            state[f"{name}/{path.name}"] = digest
+                        save_state(state)
+                        continue
+                    print(f"\n📥 {datetime.now():%H:%M:%S} {path.name} changed - queued")
+                    queued.append((path, digest))
+
+                while queued and len(pending) < MAX_WORKERS:
+                    path, digest = queued.pop(0)
+                    pending[pool.submit(parse_workbook, path)] = (path, digest)
+
+                for future in [f for f in pending if f.done()]:
+                    path, digest = pending.pop(future)
+                    try:
+                        frames = future.result()
+                    except Exception as e:
+                        print(f"   ❌ {path.name}: {e}")
+                        for name in datasets.targets(path):
+                            state[f"{name}/{path.name}"] = digest  # retry once it changes
+                        save_state(state)
+                        continue
+                    changes += check_parsed(path, digest, frames, ingested, state, allow_shrink)
+                if changes:
+                    apply_changes(changes, ingested, state, queued, allow_shrink)
+
+                if once and not pending and not queued and not watcher.seen:
+                    break
+                time.sleep(POLL_SECONDS)
+        except KeyboardInterrupt:
+            print("\n✓ Stopping...")
+        finally:
+            watcher.stop()
+
+
+if __name__ == "__main__":
+    print(f"👀 Watching {', '.join(map(str, WATCH_DIRS))} for WIP workbooks")
+    print("="*80)
+    run(once='--once' in sys.argv[1:], allow_shrink='--allow-shrink' in sys.argv[1:])